@@ -1,18 +1,108 @@
 # -*- coding: utf-8 -*-
+import asyncio
+import hashlib
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from typing import Any, Dict, List, Optional
-import json
 from pathlib import Path
 
+from jsonutil import dumps, loads
+
+_EMPTY_LIST_JSON = dumps([])
+_EMPTY_DICT_JSON = dumps({})
+
+_SQL_UPSERT_ITEM = """
+INSERT INTO items(
+    id,name,year,path,provider_ids,genres,tags,studios,
+    runtime_ticks,rating,official_rating,overview,taglines,updated_at,content_hash
+)
+VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+ON CONFLICT(id) DO UPDATE SET
+  name=excluded.name,
+  year=excluded.year,
+  path=excluded.path,
+  provider_ids=excluded.provider_ids,
+  genres=excluded.genres,
+  tags=excluded.tags,
+  studios=excluded.studios,
+  runtime_ticks=excluded.runtime_ticks,
+  rating=excluded.rating,
+  official_rating=excluded.official_rating,
+  overview=excluded.overview,
+  taglines=excluded.taglines,
+  updated_at=excluded.updated_at,
+  content_hash=excluded.content_hash
+WHERE excluded.content_hash IS NOT items.content_hash
+"""
+
+_SQL_INSERT_SUGGESTION = """
+INSERT INTO suggestions(
+    suggestion_id,suggestion_type,title,confidence,item_ids,reason,payload,created_at,applied,applied_collection_id
+)
+VALUES(?,?,?,?,?,?,?,?,?,?)
+"""
+
+_SQL_MARK_APPLIED = """
+UPDATE suggestions
+SET applied=1, applied_collection_id=?
+WHERE suggestion_id=?
+"""
+
 class DB:
     def __init__(self, db_path: str):
         Path(db_path).parent.mkdir(parents=True, exist_ok=True)
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn = self._connect(db_path)
         self._init()
+        # Single-writer pattern: all writes run on one thread with their own connection,
+        # so commits never block the event loop and readers keep using self.conn (WAL).
+        self._wconn = self._connect(db_path)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+
+    def _connect(self, db_path: str) -> sqlite3.Connection:
+        # Autocommit mode: multi-statement writes use explicit BEGIN/COMMIT via _transaction()
+        conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=256, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL;")
+        # WAL + NORMAL is durable across process crashes and avoids an fsync per commit
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        conn.execute("PRAGMA temp_store=MEMORY;")
+        conn.execute("PRAGMA mmap_size=268435456;")  # 256MB
+        conn.execute("PRAGMA cache_size=-65536;")  # 64MB
+        conn.execute("PRAGMA wal_autocheckpoint=1000;")
+        conn.execute("PRAGMA secure_delete=OFF;")
+        return conn
+
+    def close(self):
+        self._writer.shutdown(wait=True)
+        self._wconn.close()
+        self.conn.close()
+
+    def _write(self, fn, *args):
+        # Blocking call onto the writer thread (for sync callers)
+        return self._writer.submit(fn, *args).result()
+
+    async def _awrite(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._writer, fn, *args)
+
+    @contextmanager
+    def _transaction(self):
+        # Writer thread only
+        if self._wconn.in_transaction:
+            # Already inside an outer transaction; let it commit
+            yield
+            return
+        self._wconn.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self._wconn.execute("ROLLBACK")
+            raise
+        self._wconn.execute("COMMIT")
 
     def _table_has_column(self, table: str, col: str) -> bool:
-        cur = self.conn.execute(f"PRAGMA table_info({table});")
+        # table_xinfo (unlike table_info) also lists generated columns
+        cur = self.conn.execute(f"PRAGMA table_xinfo({table});")
         return any(r[1] == col for r in cur.fetchall())
 
     def _add_column_if_missing(self, table: str, col: str, ddl_type: str):
@@ -36,8 +126,9 @@ class DB:
             official_rating TEXT,
             overview TEXT,
             taglines TEXT,
-            updated_at INTEGER
-        );
+            updated_at INTEGER,
+            content_hash BLOB
+        ) WITHOUT ROWID;
         """)
 
         self.conn.execute("""
@@ -54,102 +145,176 @@ class DB:
             applied_collection_id TEXT
         );
         """)
-        self.conn.commit()
+
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS kv (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        """)
 
         # Migrations for older DBs
         self._add_column_if_missing("items", "official_rating", "TEXT")
         self._add_column_if_missing("items", "overview", "TEXT")
         self._add_column_if_missing("items", "taglines", "TEXT")
+        self._add_column_if_missing("items", "content_hash", "BLOB")
+        # Generated from the JSON text so it can be indexed and filtered in SQL
+        self._add_column_if_missing("items", "first_genre", "TEXT GENERATED ALWAYS AS (json_extract(genres, '$[0]')) VIRTUAL")
 
         self._add_column_if_missing("suggestions", "reason", "TEXT")
         self._add_column_if_missing("suggestions", "payload", "TEXT")
 
-        self.conn.commit()
+        # Indexes (after migrations so older DBs get them too)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_sugg_conf_created ON suggestions(confidence DESC, created_at DESC);")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_items_updated ON items(updated_at);")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_items_first_genre ON items(first_genre);")
 
-    def upsert_item(self, item: Dict[str, Any], now_ts: int):
-        self.conn.execute("""
-        INSERT INTO items(
-            id,name,year,path,provider_ids,genres,tags,studios,
-            runtime_ticks,rating,official_rating,overview,taglines,updated_at
-        )
-        VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-        ON CONFLICT(id) DO UPDATE SET
-          name=excluded.name,
-          year=excluded.year,
-          path=excluded.path,
-          provider_ids=excluded.provider_ids,
-          genres=excluded.genres,
-          tags=excluded.tags,
-          studios=excluded.studios,
-          runtime_ticks=excluded.runtime_ticks,
-          rating=excluded.rating,
-          official_rating=excluded.official_rating,
-          overview=excluded.overview,
-          taglines=excluded.taglines,
-          updated_at=excluded.updated_at
-        """, (
-            item.get("Id"),
+    def _item_row(self, item: Dict[str, Any], now_ts: int) -> tuple:
+        provider_ids = item.get("ProviderIds")
+        genres = item.get("Genres")
+        tags = item.get("Tags")
+        studios = item.get("Studios")
+        taglines = item.get("Taglines")
+        # Missing/empty values (the common case for tags/taglines) reuse the pre-serialized constants
+        fields = (
             item.get("Name"),
             item.get("ProductionYear"),
             item.get("Path"),
-            json.dumps(item.get("ProviderIds") or {}),
-            json.dumps(item.get("Genres") or []),
-            json.dumps(item.get("Tags") or []),
-            json.dumps(item.get("Studios") or []),
+            dumps(provider_ids) if provider_ids else _EMPTY_DICT_JSON,
+            dumps(genres) if genres else _EMPTY_LIST_JSON,
+            dumps(tags) if tags else _EMPTY_LIST_JSON,
+            dumps(studios) if studios else _EMPTY_LIST_JSON,
             item.get("RunTimeTicks") or 0,
             item.get("CommunityRating") or None,
             item.get("OfficialRating") or None,
             item.get("Overview") or None,
-            json.dumps(item.get("Taglines") or []),
-            now_ts
-        ))
-        self.conn.commit()
+            dumps(taglines) if taglines else _EMPTY_LIST_JSON,
+        )
+        # Unchanged items keep their hash and are skipped by the upsert's WHERE clause
+        content_hash = hashlib.blake2b(dumps(fields).encode("utf-8"), digest_size=8).digest()
+        return (item.get("Id"),) + fields + (now_ts, content_hash)
+
+    def _upsert_items_sync(self, items: List[Dict[str, Any]], now_ts: int) -> int:
+        before = self._wconn.total_changes
+        # One transaction (and one fsync) for the whole batch. Rows are fed lazily:
+        # executemany pulls one tuple at a time, so serialization interleaves with inserts.
+        with self._transaction():
+            self._wconn.executemany(_SQL_UPSERT_ITEM, (self._item_row(it, now_ts) for it in items))
+        return self._wconn.total_changes - before
+
+    def upsert_item(self, item: Dict[str, Any], now_ts: int) -> int:
+        return self.upsert_items_bulk([item], now_ts)
+
+    def upsert_items_bulk(self, items: List[Dict[str, Any]], now_ts: int) -> int:
+        """
+        Insert/update items in one transaction. Returns the number of rows actually written.
+        """
+        return self._write(self._upsert_items_sync, items, now_ts)
+
+    async def aupsert_items(self, items: List[Dict[str, Any]], now_ts: int) -> int:
+        return await self._awrite(self._upsert_items_sync, items, now_ts)
+
+    def get_kv(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM kv WHERE key=?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def _set_kv_sync(self, key: str, value: str):
+        self._wconn.execute("""
+        INSERT INTO kv(key,value) VALUES(?,?)
+        ON CONFLICT(key) DO UPDATE SET value=excluded.value
+        """, (key, value))
+
+    def set_kv(self, key: str, value: str):
+        self._write(self._set_kv_sync, key, value)
+
+    async def aset_kv(self, key: str, value: str):
+        await self._awrite(self._set_kv_sync, key, value)
+
+    def _delete_kv_sync(self, key: str):
+        self._wconn.execute("DELETE FROM kv WHERE key=?", (key,))
+
+    def delete_kv(self, key: str):
+        self._write(self._delete_kv_sync, key)
+
+    async def adelete_kv(self, key: str):
+        await self._awrite(self._delete_kv_sync, key)
+
+    def items_with_tag(self, tag: str) -> List[str]:
+        cur = self.conn.execute("""
+        SELECT id FROM items
+        WHERE EXISTS(SELECT 1 FROM json_each(items.tags) WHERE value=?)
+        """, (tag,))
+        return [r["id"] for r in cur]
+
+    def _clear_suggestions_sync(self):
+        self._wconn.execute("DELETE FROM suggestions;")
+
+    def _suggestion_rows(self, suggestions: List[Dict[str, Any]]) -> List[tuple]:
+        # JSON-encode every row in one comprehension; callers run this before BEGIN
+        # so the write lock is only held for the executemany
+        return [(
+            s["suggestion_id"],
+            s["suggestion_type"],
+            s["title"],
+            float(s["confidence"]),
+            dumps(s["item_ids"]),
+            s.get("reason"),
+            dumps(s["payload"]) if s.get("payload") is not None else None,
+            int(s["created_at"]),
+            1 if s.get("applied") else 0,
+            s.get("applied_collection_id"),
+        ) for s in suggestions]
+
+    def _insert_suggestions_sync(self, suggestions: List[Dict[str, Any]]):
+        rows = self._suggestion_rows(suggestions)
+        with self._transaction():
+            self._wconn.executemany(_SQL_INSERT_SUGGESTION, rows)
+
+    def _replace_suggestions_sync(self, suggestions: List[Dict[str, Any]]):
+        rows = self._suggestion_rows(suggestions)
+        with self._transaction():
+            self._clear_suggestions_sync()
+            self._wconn.executemany(_SQL_INSERT_SUGGESTION, rows)
 
     def clear_suggestions(self):
-        self.conn.execute("DELETE FROM suggestions;")
-        self.conn.commit()
+        self._write(self._clear_suggestions_sync)
 
     def insert_suggestion(self, suggestion: Dict[str, Any]):
-        self.conn.execute("""
-        INSERT INTO suggestions(
-            suggestion_id,suggestion_type,title,confidence,item_ids,reason,payload,created_at,applied,applied_collection_id
-        )
-        VALUES(?,?,?,?,?,?,?,?,?,?)
-        """, (
-            suggestion["suggestion_id"],
-            suggestion["suggestion_type"],
-            suggestion["title"],
-            float(suggestion["confidence"]),
-            json.dumps(suggestion["item_ids"]),
-            suggestion.get("reason"),
-            json.dumps(suggestion.get("payload")) if suggestion.get("payload") is not None else None,
-            int(suggestion["created_at"]),
-            1 if suggestion.get("applied") else 0,
-            suggestion.get("applied_collection_id"),
-        ))
-        self.conn.commit()
+        self.insert_suggestions_bulk([suggestion])
+
+    def insert_suggestions_bulk(self, suggestions: List[Dict[str, Any]]):
+        self._write(self._insert_suggestions_sync, suggestions)
+
+    def replace_suggestions(self, suggestions: List[Dict[str, Any]]):
+        """
+        Clear and re-insert suggestions in a single transaction.
+        """
+        self._write(self._replace_suggestions_sync, suggestions)
+
+    async def areplace_suggestions(self, suggestions: List[Dict[str, Any]]):
+        await self._awrite(self._replace_suggestions_sync, suggestions)
+
+    def _row_to_sugg(self, row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "suggestion_id": row["suggestion_id"],
+            "suggestion_type": row["suggestion_type"],
+            "title": row["title"],
+            "confidence": row["confidence"],
+            "item_ids": loads(row["item_ids"]),
+            "reason": row["reason"],
+            "payload": loads(row["payload"]) if row["payload"] else None,
+            "created_at": row["created_at"],
+            "applied": bool(row["applied"]),
+            "applied_collection_id": row["applied_collection_id"],
+        }
 
     def list_suggestions(self) -> List[Dict[str, Any]]:
-        cur = self.conn.execute("""
+        # Iterate the cursor directly instead of materializing fetchall() first
+        return [self._row_to_sugg(r) for r in self.conn.execute("""
         SELECT suggestion_id,suggestion_type,title,confidence,item_ids,reason,payload,created_at,applied,applied_collection_id
         FROM suggestions
         ORDER BY confidence DESC, created_at DESC
-        """)
-        out = []
-        for row in cur.fetchall():
-            out.append({
-                "suggestion_id": row[0],
-                "suggestion_type": row[1],
-                "title": row[2],
-                "confidence": row[3],
-                "item_ids": json.loads(row[4]),
-                "reason": row[5],
-                "payload": json.loads(row[6]) if row[6] else None,
-                "created_at": row[7],
-                "applied": bool(row[8]),
-                "applied_collection_id": row[9],
-            })
-        return out
+        """)]
 
     def get_suggestion(self, suggestion_id: str) -> Optional[Dict[str, Any]]:
         cur = self.conn.execute("""
@@ -157,25 +322,33 @@ class DB:
         FROM suggestions WHERE suggestion_id=?
         """, (suggestion_id,))
         row = cur.fetchone()
+        if not row:
+            return None
+        return self._row_to_sugg(row)
+
+    def get_suggestion_meta(self, suggestion_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Scalar columns only; skips parsing the item_ids/payload JSON.
+        """
+        row = self.conn.execute("""
+        SELECT suggestion_id,suggestion_type,title,applied,applied_collection_id
+        FROM suggestions WHERE suggestion_id=?
+        """, (suggestion_id,)).fetchone()
         if not row:
             return None
         return {
-            "suggestion_id": row[0],
-            "suggestion_type": row[1],
-            "title": row[2],
-            "confidence": row[3],
-            "item_ids": json.loads(row[4]),
-            "reason": row[5],
-            "payload": json.loads(row[6]) if row[6] else None,
-            "created_at": row[7],
-            "applied": bool(row[8]),
-            "applied_collection_id": row[9],
+            "suggestion_id": row["suggestion_id"],
+            "suggestion_type": row["suggestion_type"],
+            "title": row["title"],
+            "applied": bool(row["applied"]),
+            "applied_collection_id": row["applied_collection_id"],
         }
 
+    def _mark_applied_sync(self, suggestion_id: str, applied_collection_id: str):
+        self._wconn.execute(_SQL_MARK_APPLIED, (applied_collection_id, suggestion_id))
+
     def mark_applied(self, suggestion_id: str, applied_collection_id: str):
-        self.conn.execute("""
-        UPDATE suggestions
-        SET applied=1, applied_collection_id=?
-        WHERE suggestion_id=?
-        """, (applied_collection_id, suggestion_id))
-        self.conn.commit()
+        self._write(self._mark_applied_sync, suggestion_id, applied_collection_id)
+
+    async def amark_applied(self, suggestion_id: str, applied_collection_id: str):
+        await self._awrite(self._mark_applied_sync, suggestion_id, applied_collection_id)
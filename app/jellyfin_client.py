@@ -1,50 +1,155 @@
 # -*- coding: utf-8 -*-
+import asyncio
 import httpx
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 
 class JellyfinClient:
-    def __init__(self, base_url: str, api_key: str, user_id: str = ""):
-        self.base_url = base_url.rstrip("/")
+    # Only the fields that end up in the DB or the suggester; joined once at class load
+    _FIELDS = ",".join((
+        "ProviderIds","Path","Genres","Tags","Studios",
+        "ProductionYear","CommunityRating","RunTimeTicks",
+        "OfficialRating","Overview","Taglines"
+    ))
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        user_id: str = "",
+        user_id_provider: Optional[Callable[[], Optional[str]]] = None,
+        on_user_id: Optional[Callable[[str], Awaitable[None]]] = None,
+    ):
+        # Parsed once; requests pass relative paths and httpx joins them onto this
+        self.base_url = httpx.URL(base_url.rstrip("/"))
         self.user_id = user_id or ""
-        self.headers = {
-            "X-Emby-Token": api_key,
-            "Accept": "application/json",
-        }
+        # Optional persistence hooks so a discovered user id survives restarts.
+        # on_user_id is awaited with the new id, or "" when the stored one turned out stale.
+        self._user_id_provider = user_id_provider
+        self._on_user_id = on_user_id
+        # One pooled client for the process lifetime: keep-alive instead of a handshake per call.
+        # Auth headers live on the client, so requests don't merge a headers dict each time.
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={
+                "X-Emby-Token": api_key,
+                "Accept": "application/json",
+            },
+            timeout=60,
+            limits=httpx.Limits(max_keepalive_connections=20),
+        )
+
+    async def aclose(self):
+        await self._client.aclose()
 
     async def get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        url = f"{self.base_url}{path}"
-        async with httpx.AsyncClient(timeout=60) as client:
-            r = await client.get(url, headers=self.headers, params=params)
-            r.raise_for_status()
-            return r.json()
+        r = await self._client.get(path, params=params)
+        r.raise_for_status()
+        return r.json()
 
     async def post(self, path: str, json_body: Optional[Dict[str, Any]] = None, params: Optional[Dict[str, Any]] = None):
-        url = f"{self.base_url}{path}"
-        async with httpx.AsyncClient(timeout=60) as client:
-            r = await client.post(url, headers=self.headers, json=json_body, params=params)
-            return r
+        return await self._client.post(path, json=json_body, params=params)
 
     async def ensure_user_id(self) -> str:
         if self.user_id:
             return self.user_id
+        if self._user_id_provider:
+            self.user_id = self._user_id_provider() or ""
+            if self.user_id:
+                return self.user_id
         # Try to pick the first user
         users = await self.get("/Users")
         if isinstance(users, list) and users:
             self.user_id = users[0].get("Id", "")
+        if self.user_id and self._on_user_id:
+            await self._on_user_id(self.user_id)
         return self.user_id
 
-    async def fetch_movies(self) -> List[Dict[str, Any]]:
-        params = {
+    async def _forget_user_id(self, uid: str):
+        # Concurrent callers may already have replaced it; only drop the stale id
+        if self.user_id != uid:
+            return
+        self.user_id = ""
+        if self._on_user_id:
+            await self._on_user_id("")
+
+    def _movie_params(self) -> Dict[str, Any]:
+        return {
             "IncludeItemTypes": "Movie",
             "Recursive": "true",
-            "Fields": ",".join([
-                "ProviderIds","Path","Genres","Tags","Studios",
-                "ProductionYear","PremiereDate","SortName","OriginalTitle",
-                "CommunityRating","RunTimeTicks",
-                "OfficialRating","Overview","Taglines"
-            ])
+            "Fields": self._FIELDS,
         }
-        data = await self.get("/Items", params=params)
+
+    async def iter_movies_paged(self, page_size: int = 1000, concurrency: int = 4) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Yield the library in pages of `page_size`. The first page's TotalRecordCount
+        says how many pages remain; exactly those are requested, at most `concurrency`
+        in flight, and yielded in order.
+        The sort keys are not unique (remakes share a SortName), so OFFSET paging can
+        return a tied item twice; items already yielded are dropped by Id.
+        """
+        async def _page(index: int) -> Dict[str, Any]:
+            params = self._movie_params()
+            params.update({
+                # Extra keys only narrow ties; none of Jellyfin's sort fields is unique
+                "SortBy": "SortName,ProductionYear,DateCreated",
+                "SortOrder": "Ascending",
+                "StartIndex": index * page_size,
+                "Limit": page_size,
+                # Only the first page's count is read; later pages skip computing it
+                "EnableTotalRecordCount": "true" if index == 0 else "false",
+            })
+            return await self.get("/Items", params=params)
+
+        seen = set()
+
+        def _unseen(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            out = []
+            for it in items:
+                item_id = it.get("Id")
+                if item_id is not None:
+                    if item_id in seen:
+                        continue
+                    seen.add(item_id)
+                out.append(it)
+            return out
+
+        first = await _page(0)
+        items = first.get("Items", [])
+        page = _unseen(items)
+        if page:
+            yield page
+
+        total = first.get("TotalRecordCount")
+        if not isinstance(total, int):
+            # Server didn't report a count: page one at a time until a short page
+            index = 1
+            while len(items) >= page_size:
+                items = (await _page(index)).get("Items", [])
+                index += 1
+                page = _unseen(items)
+                if page:
+                    yield page
+            return
+
+        sem = asyncio.Semaphore(concurrency)
+
+        async def _bounded(index: int) -> List[Dict[str, Any]]:
+            async with sem:
+                return (await _page(index)).get("Items", [])
+
+        # Pages 1..ceil(total / page_size) - 1; empty when the first page held everything
+        tasks = [asyncio.ensure_future(_bounded(i)) for i in range(1, -(-total // page_size))]
+        try:
+            for task in tasks:
+                page = _unseen(await task)
+                if page:
+                    yield page
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def fetch_movies(self) -> List[Dict[str, Any]]:
+        data = await self.get("/Items", params=self._movie_params())
         return data.get("Items", [])
 
     async def create_collection(self, name: str) -> Dict[str, Any]:
@@ -65,6 +170,19 @@ class JellyfinClient:
         if not uid:
             raise RuntimeError("No Jellyfin user id available. Set JELLYFIN_USER_ID.")
         # Some Jellyfin versions want no Fields param here; fetch full and read Tags.
+        try:
+            return await self.get(f"/Users/{uid}/Items/{item_id}")
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 404:
+                raise
+            # 404 can mean a missing item or a deleted user; only the latter is retried
+            r = await self._client.get(f"/Users/{uid}")
+            if r.status_code != 404:
+                raise
+        await self._forget_user_id(uid)
+        uid = await self.ensure_user_id()
+        if not uid:
+            raise RuntimeError("No Jellyfin user id available. Set JELLYFIN_USER_ID.")
         return await self.get(f"/Users/{uid}/Items/{item_id}")
 
     async def update_item_tags_metadata(self, item_id: str, tags: List[str]) -> Dict[str, Any]:
@@ -101,3 +219,18 @@ class JellyfinClient:
 
         new_tags = existing + [tag]
         return await self.update_item_tags_metadata(item_id, new_tags)
+
+    async def add_tags_bulk(self, pairs: List[Tuple[str, str]], concurrency: int = 16) -> List[Dict[str, Any]]:
+        """
+        Apply (item_id, tag) pairs concurrently, at most `concurrency` in flight.
+        Results are returned in the same order as `pairs`.
+        """
+        # Resolve the user once up front so concurrent calls don't all hit /Users
+        await self.ensure_user_id()
+        sem = asyncio.Semaphore(concurrency)
+
+        async def _one(pair: Tuple[str, str]) -> Dict[str, Any]:
+            async with sem:
+                return await self.add_tag_to_item(*pair)
+
+        return await asyncio.gather(*[_one(p) for p in pairs])
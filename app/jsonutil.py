@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+# JSON helpers: use orjson when available, stdlib json otherwise.
+try:
+    import orjson
+
+    def dumps(obj) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+
+    loads = orjson.loads
+except ImportError:
+    from json import dumps, loads
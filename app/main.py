@@ -17,12 +17,29 @@ logging.basicConfig(
 log = logging.getLogger("jellyfin-organizer")
 
 db = DB(f"{settings.data_dir}/organizer.sqlite3")
-jf = JellyfinClient(settings.jellyfin_url, settings.jellyfin_api_key)
+
+async def _store_user_id(uid: str):
+    # Runs on the writer thread without blocking the event loop; "" forgets a stale id
+    if uid:
+        await db.aset_kv("jellyfin_user_id", uid)
+    else:
+        await db.adelete_kv("jellyfin_user_id")
+
+jf = JellyfinClient(
+    settings.jellyfin_url,
+    settings.jellyfin_api_key,
+    user_id_provider=lambda: db.get_kv("jellyfin_user_id"),
+    on_user_id=_store_user_id,
+)
+
+SCAN_PAGE_SIZE = 1000
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     log.info("Started. Dry-run=%s Jellyfin=%s", settings.dry_run, settings.jellyfin_url)
     yield
+    await jf.aclose()
+    db.close()
 
 app = FastAPI(title="Jellyfin Organizer", version="1.0.0", lifespan=lifespan)
 app.include_router(web_router)
@@ -34,16 +51,17 @@ def health():
 @app.post("/scan")
 async def scan():
     now = int(time.time())
-    items = await jf.fetch_movies()
 
-    for it in items:
-        db.upsert_item(it, now)
-
-    db.clear_suggestions()
+    # Write each page to the DB while the next pages are still downloading
+    items = []
+    changed = 0
+    async for page in jf.iter_movies_paged(page_size=SCAN_PAGE_SIZE):
+        items.extend(page)
+        changed += await db.aupsert_items(page, now)
 
     suggestions = build_suggestions(
         items=items,
-        franchise_rules=settings.franchise_rules(),
+        franchise_rules=settings.franchise_rules,
         min_group_size=settings.min_group_size,
         enable_franchise=settings.enable_franchise,
         enable_studio=settings.enable_studio,
@@ -51,14 +69,14 @@ async def scan():
         enable_length=settings.enable_length,
         enable_audience=settings.enable_audience,
         enable_mood=settings.enable_mood,
-        studio_allowlist=settings.studio_allowlist(),
+        studio_allowlist=settings.studio_allowlist,
         top_studios=settings.top_studios
     )
 
-    for s in suggestions:
-        db.insert_suggestion(s)
+    # One transaction for DELETE + INSERT, so the WAL sees a single write
+    await db.areplace_suggestions(suggestions)
 
-    log.info("Scan complete: %d items, %d suggestions", len(items), len(suggestions))
+    log.info("Scan complete: %d items (%d changed), %d suggestions", len(items), changed, len(suggestions))
     return {"items": len(items), "suggestions": len(suggestions), "dry_run": settings.dry_run}
 
 @app.get("/suggestions")
@@ -67,11 +85,15 @@ def list_suggestions():
 
 @app.post("/apply/{suggestion_id}")
 async def apply_suggestion(suggestion_id: str):
+    meta = db.get_suggestion_meta(suggestion_id)
+    if not meta:
+        raise HTTPException(status_code=404, detail="Suggestion not found")
+    if meta["applied"]:
+        return {"ok": True, "already_applied": True, "applied_collection_id": meta["applied_collection_id"]}
+
     s = db.get_suggestion(suggestion_id)
     if not s:
         raise HTTPException(status_code=404, detail="Suggestion not found")
-    if s["applied"]:
-        return {"ok": True, "already_applied": True, "applied_collection_id": s["applied_collection_id"]}
 
     # DRY RUN
     if settings.dry_run:
@@ -105,7 +127,7 @@ async def apply_suggestion(suggestion_id: str):
         if isinstance(add_res, dict) and add_res.get("ok") is False:
             raise HTTPException(status_code=500, detail=f"Failed to add items to collection: {add_res}")
 
-        db.mark_applied(suggestion_id, collection_id)
+        await db.amark_applied(suggestion_id, collection_id)
         log.info("Applied %s as collection: %s -> %s (%d items)",
                  s["suggestion_type"], s["title"], collection_id, len(s["item_ids"]))
 
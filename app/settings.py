@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
+from functools import cached_property
 from pydantic_settings import BaseSettings
 from pydantic import Field
-import json
+
+from jsonutil import loads
 
 class Settings(BaseSettings):
     jellyfin_url: str = Field(alias="JELLYFIN_URL")
@@ -30,18 +32,21 @@ class Settings(BaseSettings):
 
     data_dir: str = "/data"
 
-    def franchise_rules(self):
+    # Parsed once per Settings instance; values are tuples so callers can't mutate shared state
+    @cached_property
+    def franchise_rules(self) -> dict[str, tuple[str, ...]]:
         try:
-            obj = json.loads(self.franchise_rules_json or "{}")
-            return {k: [kw.lower() for kw in v] for k, v in obj.items()}
+            obj = loads(self.franchise_rules_json or "{}")
+            return {k: tuple(kw.lower() for kw in v) for k, v in obj.items()}
         except Exception:
             return {}
 
-    def studio_allowlist(self):
+    @cached_property
+    def studio_allowlist(self) -> tuple[str, ...]:
         try:
-            arr = json.loads(self.studio_allowlist_json or "[]")
-            return [str(x).lower().strip() for x in arr if str(x).strip()]
+            arr = loads(self.studio_allowlist_json or "[]")
+            return tuple(str(x).lower().strip() for x in arr if str(x).strip())
         except Exception:
-            return []
+            return ()
 
 settings = Settings()
@@ -1,12 +1,30 @@
 ﻿# -*- coding: utf-8 -*-
+import bisect
+import functools
+import itertools
+import operator
 import re
+import sys
 import time
 import uuid
-from typing import Any, Dict, List, Tuple
+from typing import AbstractSet, Any, Callable, Dict, List, Optional, Set, Tuple
 from collections import defaultdict, Counter
 
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
 _ROMAN = {"i":1,"ii":2,"iii":3,"iv":4,"v":5,"vi":6,"vii":7,"viii":8,"ix":9,"x":10}
 
+# Compiled once; _normalize_title runs for every item.
+# Every pattern in this module is case-sensitive: inputs are lowercased before matching
+# (_normalize_title, _text_blob, _canon_studio, and settings lowercases franchise
+# keywords), so nothing needs re.IGNORECASE and its Unicode case folding. The keyword
+# patterns are re.escape'd literals; only _PUNCT_RE uses the Unicode-aware \w/\s on
+# purpose, so titles like "Amélie" keep their letters.
+_PUNCT_RE = re.compile(r"[^\w\s:]")
+
 GENERIC_STUDIOS = {
     "amazon", "amazon studios", "netflix", "paramount", "warner bros",
     "warner bros.", "universal", "20th century fox", "fox", "sony", "columbia",
@@ -29,48 +47,153 @@ STUDIO_CANON = {
     "a24": "A24",
 }
 
+def _canon_key_order() -> Tuple[str, ...]:
+    # STUDIO_CANON's own order decides between unrelated keys ("disney pixar" -> Pixar);
+    # a key only moves ahead of the shorter keys it contains, so e.g.
+    # "walt disney animation studios" wins over "walt disney"
+    keys: List[str] = []
+    for k in STUDIO_CANON:
+        pos = next((i for i, placed in enumerate(keys) if placed in k), len(keys))
+        keys.insert(pos, k)
+    return tuple(keys)
+
+_CANON_KEYS = _canon_key_order()
+
+# Overview/tagline keywords per mood/occasion tag (substring match on the lowercased blob)
+MOOD_KEYWORDS = {
+    "occasion:christmas": ("christmas","santa","holiday","xmas","north pole","reindeer"),
+    "occasion:halloween": ("halloween","pumpkin","witch","haunted","ghost","spooky"),
+    "mood:scary": ("terror","haunted","killer","slasher","demon"),
+    "mood:funny": ("hilarious","funny","comedian","laugh"),
+    "mood:action": ("explosive","assassin","fight","battle","mission"),
+    "mood:cozy": ("heartwarming","friendship","gentle","cozy","wholesome","feel-good","feel good"),
+    "mood:emotional": ("tearjerker","grief","loss","tragic","emotional"),
+    "mood:dark": ("dark","corrupt","serial","noir"),
+}
+
+# ASCII characters _PUNCT_RE would delete, as a bytes.translate delete table
+_PUNCT_ASCII = bytes(c for c in range(128) if _PUNCT_RE.match(chr(c)))
+
 def _normalize_title(name: str) -> str:
-    s = (name or "").lower().strip()
-    s = re.sub(r"\s+", " ", s)
-    s = re.sub(r"[^\w\s:]", "", s)
-    return s
+    # split()/join strips and collapses whitespace runs (same set as \s) to single spaces
+    s = " ".join((name or "").lower().split())
+    if s.isascii():
+        # Most titles: drop punctuation in a single C-level pass, no regex engine
+        return s.encode("ascii").translate(None, _PUNCT_ASCII).decode("ascii")
+    return _PUNCT_RE.sub("", s)
 
 def _title_core(norm: str) -> str:
     return norm.split(":", 1)[0].strip()
 
 def _strip_sequel_suffix(core: str) -> str:
-    tokens = core.split()
-    if not tokens:
+    # Only the last two tokens matter: rsplit stops after two splits from the right
+    parts = core.rsplit(None, 2)
+    if not parts:
         return core
-    if len(tokens) >= 2 and tokens[-2] == "part" and tokens[-1].isdigit():
-        return " ".join(tokens[:-2]).strip()
-    last = tokens[-1]
-    if last.isdigit() or last in _ROMAN:
-        return " ".join(tokens[:-1]).strip()
-    return core
+    last = parts[-1]
+    if len(parts) >= 2 and parts[-2] == "part" and last.isdigit():
+        keep = parts[:-2]
+    elif last.isdigit() or last in _ROMAN:
+        keep = parts[:-1]
+    else:
+        return core
+    # Stripped keys have their space runs collapsed, as a full split()/join did
+    return " ".join(" ".join(keep).split())
 
-def _base_key(name: str) -> str:
-    norm = _normalize_title(name)
+def _base_key_from_norm(norm: str) -> str:
     core = _title_core(norm)
     return _strip_sequel_suffix(core)
 
-def _has_sequel_marker(name: str) -> bool:
-    norm = _normalize_title(name)
-    core = _title_core(norm)
-    tokens = core.split()
-    if not tokens:
+def _base_key(name: str) -> str:
+    return _base_key_from_norm(_normalize_title(name))
+
+def _has_sequel_marker_from_norm(norm: str) -> bool:
+    # "part N" ends in a digit too, so the last token alone decides
+    parts = _title_core(norm).rsplit(None, 1)
+    if not parts:
         return False
-    last = tokens[-1]
-    if last.isdigit() or last in _ROMAN:
-        return True
-    if len(tokens) >= 2 and tokens[-2] == "part" and tokens[-1].isdigit():
-        return True
-    return False
+    last = parts[-1]
+    return last.isdigit() or last in _ROMAN
+
+def _has_sequel_marker(name: str) -> bool:
+    return _has_sequel_marker_from_norm(_normalize_title(name))
+
+def _compile_franchise_re(franchise_rules: Dict[str, List[str]]):
+    """
+    One alternation over every franchise keyword; the named group that
+    matched (g<N>) maps back to its collection via the returned dict.
+    """
+    parts = []
+    group_coll = {}
+    for coll, kws in franchise_rules.items():
+        for kw in kws:
+            g = f"g{len(parts)}"
+            parts.append(f"(?P<{g}>{re.escape(kw)})")
+            group_coll[g] = coll
+    if not parts:
+        return None, group_coll
+    return re.compile("|".join(parts)), group_coll
+
+def _franchise_matcher(franchise_rules: Dict[str, List[str]]) -> Optional[Callable[[str], Set[str]]]:
+    """
+    Returns norm -> set of matching collection names, or None if there are no keywords.
+    Uses an Aho-Corasick automaton (cost independent of keyword count) when
+    pyahocorasick is installed, otherwise the compiled alternation.
+    """
+    if not any(franchise_rules.values()):
+        return None
+    # No prefilter: any cheap exact test for substring keywords (e.g. title length)
+    # rejects almost nothing and would only add a call per title
+    return _franchise_scanner(franchise_rules)
+
+def _franchise_scanner(franchise_rules: Dict[str, List[str]]) -> Callable[[str], Set[str]]:
+    if ahocorasick is not None:
+        # "" matches every title (as `"" in norm` did) but can't go in the automaton
+        always = frozenset(coll for coll, kws in franchise_rules.items() if "" in kws)
+        automaton = ahocorasick.Automaton()
+        for coll, kws in franchise_rules.items():
+            for kw in kws:
+                if kw:
+                    # add_word replaces an existing value, so a keyword shared by several
+                    # collections stores all of them
+                    automaton.add_word(kw, automaton.get(kw, ()) + (coll,))
+        if len(automaton) == 0:
+            return lambda norm: always
+        automaton.make_automaton()
+        # iter() reports every occurrence, overlapping ones included
+        return lambda norm: always.union(*(colls for _, colls in automaton.iter(norm)))
+
+    franchise_re, group_coll = _compile_franchise_re(franchise_rules)
+    # Per-collection alternations for confirming overlaps; a collection without
+    # keywords can never match, so it gets no pattern
+    coll_res = [(coll, re.compile("|".join(map(re.escape, kws)))) for coll, kws in franchise_rules.items() if kws]
+
+    def match(norm: str) -> Set[str]:
+        # One C-level scan; most titles match no keyword at all
+        m = franchise_re.search(norm)
+        if m is None:
+            return set()
+        first = group_coll[m.lastgroup]
+        # Keywords can overlap, so confirm the other collections explicitly
+        return {coll for coll, rx in coll_res if coll == first or rx.search(norm)}
+
+    return match
 
 def _list_lower(x) -> List[str]:
     if not x:
         return []
     if isinstance(x, list):
+        # Jellyfin lists are homogeneous: plain strings (Genres, Taglines) or
+        # [{"Name": ...}] (Studios). Pick the path from the first element; a mixed
+        # list makes the comprehension raise and falls through to the generic loop.
+        first = x[0]
+        try:
+            if isinstance(first, str):
+                return [v.lower() for v in x]
+            if isinstance(first, dict):
+                return [str(v["Name"]).lower() for v in x]
+        except (AttributeError, KeyError, TypeError):
+            pass
         out = []
         for v in x:
             if isinstance(v, str):
@@ -98,86 +221,107 @@ def _text_blob(item: Dict[str, Any]) -> str:
         taglines = str(taglines)
     return (overview + " " + taglines).lower()
 
+# Pure function of the name and the module-level tables; the same few studios recur on every item
+@functools.lru_cache(maxsize=1024)
 def _canon_studio(name: str) -> str:
     n = (name or "").lower().strip()
-    for k, v in STUDIO_CANON.items():
+    for k in _CANON_KEYS:
         if k in n:
-            return v
-    # fallback: title-case original-ish
-    return (name or "").strip()
-
-def _format_tag(item: Dict[str, Any]) -> str:
-    genres = set(_list_lower(item.get("Genres")))
+            return STUDIO_CANON[k]
+    # fallback: title-case original-ish. Interned so every item naming this studio
+    # shares one key object, even after the lru entry is evicted
+    return sys.intern((name or "").strip())
+
+# Canonical studio name -> "studio:<name>" tag, each distinct tag built and interned once
+_STUDIO_TAG_CACHE: Dict[str, str] = {}
+
+def _studio_tag(studio_name: str) -> str:
+    t = _STUDIO_TAG_CACHE.get(studio_name)
+    if t is None:
+        t = sys.intern(f"studio:{studio_name.lower().replace(' ', '_')}")
+        _STUDIO_TAG_CACHE[studio_name] = t
+    return t
+
+def _format_tag_from_genres(genres: AbstractSet[str]) -> str:
     if "documentary" in genres:
         return "format:documentary"
     if "animation" in genres:
         return "format:animation"
     return "format:live_action"
 
+def _format_tag(item: Dict[str, Any]) -> str:
+    return _format_tag_from_genres(set(_list_lower(item.get("Genres"))))
+
+# Upper bounds (inclusive, minutes) of each length bucket; anything above is epic
+_LENGTH_BOUNDS = (75, 110, 140)
+_LENGTH_TAGS = ("length:short", "length:standard", "length:long", "length:epic")
+
+def _length_tag_from_minutes(m: int) -> str:
+    if not m:
+        return "length:unknown"
+    return _LENGTH_TAGS[bisect.bisect_left(_LENGTH_BOUNDS, m)]
+
 def _length_tag(item: Dict[str, Any]) -> str:
-    m = _runtime_minutes(item)
-    if m and m <= 75:
-        return "length:short"
-    if m and m <= 110:
-        return "length:standard"
-    if m and m <= 140:
-        return "length:long"
-    if m:
-        return "length:epic"
-    return "length:unknown"
+    return _length_tag_from_minutes(_runtime_minutes(item))
 
-def _audience_tag(item: Dict[str, Any]) -> str:
-    r = _official_rating(item)
-    genres = set(_list_lower(item.get("Genres")))
+# Ratings that decide the audience on their own (PG also looks at genres)
+_AUDIENCE_BY_RATING = {
     # Strong exclusions
-    if r in {"R","NC-17","TV-MA"}:
-        return "audience:adults"
+    "R": "audience:adults", "NC-17": "audience:adults", "TV-MA": "audience:adults",
     # Family/kids leaning
-    if r in {"G","TV-Y","TV-Y7","TV-G"}:
-        return "audience:kids"
+    "G": "audience:kids", "TV-Y": "audience:kids", "TV-Y7": "audience:kids", "TV-G": "audience:kids",
+    "PG-13": "audience:teens",
+}
+
+def _audience_tag_from(r: str, genres: AbstractSet[str]) -> str:
+    tag = _AUDIENCE_BY_RATING.get(r)
+    if tag is not None:
+        return tag
     if r == "PG":
         # if horror/thriller present, avoid "family"
         if "horror" in genres or "thriller" in genres:
             return "audience:teens"
         return "audience:family"
-    if r == "PG-13":
-        return "audience:teens"
     # Unknown rating: infer from genres (weak)
     if "animation" in genres or "family" in genres:
         return "audience:family"
     return "audience:general"
 
-def _mood_tags(item: Dict[str, Any]) -> List[Tuple[str, float, str]]:
+def _audience_tag(item: Dict[str, Any]) -> str:
+    return _audience_tag_from(_official_rating(item), set(_list_lower(item.get("Genres"))))
+
+def _mood_keyword_hits(blob: str) -> Set[str]:
     """
-    Returns list of (tag, confidence, reason). Lower confidence than other axes.
+    Tags whose overview/tagline keywords occur in `blob`. Each test is a C-level
+    substring search; a regex alternation would run in the interpreted sre engine.
     """
-    genres = set(_list_lower(item.get("Genres")))
-    blob = _text_blob(item)
-    r = _official_rating(item)
+    return {tag for tag, kws in MOOD_KEYWORDS.items() if any(k in blob for k in kws)}
 
+def _mood_tags_from(genres: AbstractSet[str], blob: str, r: str) -> List[Tuple[str, float, str]]:
+    """
+    Returns list of (tag, confidence, reason). Lower confidence than other axes.
+    """
     out: List[Tuple[str, float, str]] = []
-
-    def has(words: List[str]) -> bool:
-        return any(w in blob for w in words)
+    hits = _mood_keyword_hits(blob)
 
     # Occasion
-    if has(["christmas","santa","holiday","xmas","north pole","reindeer"]):
+    if "occasion:christmas" in hits:
         out.append(("occasion:christmas", 0.80, "overview/tagline keywords"))
-    if has(["halloween","pumpkin","witch","haunted","ghost","spooky"]):
+    if "occasion:halloween" in hits:
         out.append(("occasion:halloween", 0.75, "overview/tagline keywords"))
 
     # Mood/tone
-    if "horror" in genres or has(["terror","haunted","killer","slasher","demon"]):
+    if "horror" in genres or "mood:scary" in hits:
         out.append(("mood:scary", 0.70, "genre/keywords"))
-    if "comedy" in genres or has(["hilarious","funny","comedian","laugh"]):
+    if "comedy" in genres or "mood:funny" in hits:
         out.append(("mood:funny", 0.70, "genre/keywords"))
-    if "action" in genres or has(["explosive","assassin","fight","battle","mission"]):
+    if "action" in genres or "mood:action" in hits:
         out.append(("mood:action", 0.65, "genre/keywords"))
-    if has(["heartwarming","friendship","gentle","cozy","wholesome","feel-good","feel good"]):
+    if "mood:cozy" in hits:
         out.append(("mood:cozy", 0.65, "keywords"))
-    if has(["tearjerker","grief","loss","tragic","emotional"]):
+    if "mood:emotional" in hits:
         out.append(("mood:emotional", 0.65, "keywords"))
-    if "thriller" in genres or "crime" in genres or has(["dark","corrupt","serial","noir"]):
+    if "thriller" in genres or "crime" in genres or "mood:dark" in hits:
         out.append(("mood:dark", 0.60, "genre/keywords"))
 
     # Safety dampener: if R/TV-MA, cozy/family-ish moods drop
@@ -186,16 +330,26 @@ def _mood_tags(item: Dict[str, Any]) -> List[Tuple[str, float, str]]:
 
     return out
 
-def _make_suggestion(s_type: str, title: str, confidence: float, item_ids: List[str], reason: str, payload: Dict[str, Any], now: int):
+def _mood_tags(item: Dict[str, Any]) -> List[Tuple[str, float, str]]:
+    return _mood_tags_from(set(_list_lower(item.get("Genres"))), _text_blob(item), _official_rating(item))
+
+def _groups_from_appends(appends: Dict[Any, Callable[[Any], None]]) -> Dict[Any, List[Any]]:
+    # Each value is a bound list.append; __self__ is the list it appends to
+    return {k: a.__self__ for k, a in appends.items()}
+
+def _make_suggestion(s_type: str, title: str, confidence: float, item_ids: List[str], reason: str, payload: Dict[str, Any], now: int,
+                     id_base: str, id_ctr: "itertools.count[int]"):
     return {
-        "suggestion_id": str(uuid.uuid4()),
+        # Unique per scan: one random base per build_suggestions call + a counter
+        "suggestion_id": f"{id_base}{next(id_ctr):08x}",
         "suggestion_type": s_type,
         "title": title,
         "confidence": float(confidence),
         "item_ids": item_ids,
         "reason": reason,
         "payload": payload,
-        "created_at": now
+        "created_at": now,
+        "_sortkey": (-float(confidence), -len(item_ids)),
     }
 
 def build_suggestions(
@@ -212,21 +366,114 @@ def build_suggestions(
     top_studios: int
 ) -> List[Dict[str, Any]]:
     now = int(time.time())
+    id_base = uuid.uuid4().hex[:24]
+    id_ctr = itertools.count()
     suggestions: List[Dict[str, Any]] = []
 
     # ----------------------
-    # A) Franchise collections
+    # Per-item values are computed once into parallel columns (only the ones an
+    # enabled axis reads); each axis then walks item_ids + its column(s) by position
     # ----------------------
+    match_franchises = _franchise_matcher(franchise_rules) if enable_franchise else None
+    need_genres = enable_format or enable_audience or enable_mood
+    need_rating = enable_audience or enable_mood
+
+    item_ids = [it.get("Id") for it in items]
+    genres_sets = [frozenset(_list_lower(it.get("Genres"))) for it in items] if need_genres else []
+    ratings = [_official_rating(it) for it in items] if need_rating else []
+    runtimes = [_runtime_minutes(it) for it in items] if enable_length else []
+    blobs = [_text_blob(it) for it in items] if enable_mood else []
+    norms = [_normalize_title(it.get("Name") or "") for it in items] if enable_franchise else []
+
+    # Grouping dicts map key -> bound list.append (no attribute lookup per add);
+    # _groups_from_appends turns them back into key -> list afterwards.
+    rule_add = {}
+    base_add = {}
+    sequel_flags = defaultdict(int)
+    studio_counts = Counter()
+    item_studios = {}
+    fmt_add = {}
+    len_add = {}
+    aud_add = {}
+    mood_add = {}
+    mood_reason = defaultdict(lambda: Counter())
+
     if enable_franchise:
-        # Keyword-based franchise rules (strong)
-        rule_groups = defaultdict(list)
-        for it in items:
-            name = it.get("Name") or ""
-            norm = _normalize_title(name)
-            for coll, kws in franchise_rules.items():
-                if any(kw in norm for kw in kws):
-                    rule_groups[coll].append(it.get("Id"))
+        for item_id, norm in zip(item_ids, norms):
+            # Keyword-based franchise rules (strong)
+            if match_franchises is not None:
+                hits = match_franchises(norm)
+                if hits:
+                    # Rule order, as before
+                    for coll in franchise_rules:
+                        if coll in hits:
+                            try:
+                                rule_add[coll](item_id)
+                            except KeyError:
+                                rule_add[coll] = [item_id].append
+            # Title sequel pattern (Police Academy 2: ..., Rocky II, Part 2)
+            base = _base_key_from_norm(norm)
+            if base:
+                try:
+                    base_add[base](item_id)
+                except KeyError:
+                    base_add[base] = [item_id].append
+                if _has_sequel_marker_from_norm(norm):
+                    sequel_flags[base] += 1
+
+    if enable_studio:
+        # Generic studios never become tags unless allowlisted (and top-N selection skips
+        # them), so drop them before canonicalizing. None of them maps to a canon name.
+        skip_studios = GENERIC_STUDIOS.difference(s.lower() for s in studio_allowlist if s)
+        for item_id, it in zip(item_ids, items):
+            # Studios field can be list of dicts with Name; _list_lower handles
+            studs = [s for s in map(str.strip, _list_lower(it.get("Studios"))) if s and s not in skip_studios]
+            if not studs:
+                item_studios[item_id] = studs
+                continue
+            canon_list = [_canon_studio(s) for s in studs]
+            canon_list = [c for c in canon_list if c]
+            item_studios[item_id] = canon_list
+            for c in canon_list:
+                studio_counts[c.lower()] += 1
+
+    # Single-tag axes, gated once here: each entry is (grouping dict, tag function,
+    # columns passed to it), so the per-item loop below carries no enable_* checks
+    active_axes = []
+    if enable_format:
+        active_axes.append((fmt_add, _format_tag_from_genres, (genres_sets,)))
+    if enable_length:
+        active_axes.append((len_add, _length_tag_from_minutes, (runtimes,)))
+    if enable_audience:
+        active_axes.append((aud_add, _audience_tag_from, (ratings, genres_sets)))
+
+    for adds, tag_fn, cols in active_axes:
+        for item_id, tag in zip(item_ids, map(tag_fn, *cols)):
+            try:
+                adds[tag](item_id)
+            except KeyError:
+                adds[tag] = [item_id].append
+
+    if enable_mood:
+        for item_id, genres, blob, rating in zip(item_ids, genres_sets, blobs, ratings):
+            for tag, conf, rsn in _mood_tags_from(genres, blob, rating):
+                try:
+                    mood_add[tag]((item_id, conf))
+                except KeyError:
+                    mood_add[tag] = [(item_id, conf)].append
+                mood_reason[tag][rsn] += 1
 
+    rule_groups = _groups_from_appends(rule_add)
+    base_groups = _groups_from_appends(base_add)
+    fmt_groups = _groups_from_appends(fmt_add)
+    len_groups = _groups_from_appends(len_add)
+    aud_groups = _groups_from_appends(aud_add)
+    mood_groups = _groups_from_appends(mood_add)
+
+    # ----------------------
+    # A) Franchise collections
+    # ----------------------
+    if enable_franchise:
         for coll_name, ids in rule_groups.items():
             if len(ids) >= min_group_size:
                 suggestions.append(_make_suggestion(
@@ -236,21 +483,9 @@ def build_suggestions(
                     ids,
                     "matched franchise keywords",
                     {"collection_name": coll_name},
-                    now
+                    now, id_base, id_ctr
                 ))
 
-        # Title sequel pattern (Police Academy 2: ..., Rocky II, Part 2)
-        base_groups = defaultdict(list)
-        sequel_flags = defaultdict(int)
-        for it in items:
-            name = it.get("Name") or ""
-            base = _base_key(name)
-            if not base:
-                continue
-            base_groups[base].append(it.get("Id"))
-            if _has_sequel_marker(name):
-                sequel_flags[base] += 1
-
         for base, ids in base_groups.items():
             if len(ids) < min_group_size:
                 continue
@@ -263,25 +498,14 @@ def build_suggestions(
                 ids,
                 "title sequel pattern (2/II/Part 2, subtitles)",
                 {"collection_name": base.title()},
-                now
+                now, id_base, id_ctr
             ))
 
     # ----------------------
     # B) Studio tags
     # ----------------------
     if enable_studio:
-        # Count studios to choose top ones if allowlist not provided
-        studio_counts = Counter()
-        item_studios = {}
-        for it in items:
-            studs = _list_lower(it.get("Studios"))
-            # Studios field can be list of dicts with Name; _list_lower handles
-            canon_list = [_canon_studio(s) for s in studs if s.strip()]
-            canon_list = [c for c in canon_list if c]
-            item_studios[it.get("Id")] = canon_list
-            for c in canon_list:
-                studio_counts[c.lower()] += 1
-
+        # Choose top studios if allowlist not provided
         allowed = set([s.lower() for s in studio_allowlist if s]) if studio_allowlist else None
         if allowed is None:
             # Auto-select top studios, excluding very generic ones
@@ -294,15 +518,19 @@ def build_suggestions(
                     break
             allowed = set(top)
 
-        groups = defaultdict(list)
+        studio_add = {}
         for item_id, studios in item_studios.items():
             for st in studios:
                 if st.lower() in allowed:
-                    groups[st].append(item_id)
+                    try:
+                        studio_add[st](item_id)
+                    except KeyError:
+                        studio_add[st] = [item_id].append
+        groups = _groups_from_appends(studio_add)
 
         for studio_name, ids in groups.items():
             if len(ids) >= min_group_size:
-                tag = f"studio:{studio_name.lower().replace(' ', '_')}"
+                tag = _studio_tag(studio_name)
                 suggestions.append(_make_suggestion(
                     "tag",
                     f"Studio: {studio_name}",
@@ -310,18 +538,13 @@ def build_suggestions(
                     ids,
                     "studio match",
                     {"tag": tag},
-                    now
+                    now, id_base, id_ctr
                 ))
 
     # ----------------------
     # C) Format tags
     # ----------------------
     if enable_format:
-        fmt_groups = defaultdict(list)
-        for it in items:
-            tag = _format_tag(it)
-            fmt_groups[tag].append(it.get("Id"))
-
         fmt_titles = {
             "format:animation": "Format: Animation",
             "format:live_action": "Format: Live Action",
@@ -336,18 +559,13 @@ def build_suggestions(
                     ids,
                     "genre-based format",
                     {"tag": tag},
-                    now
+                    now, id_base, id_ctr
                 ))
 
     # ----------------------
     # D) Length tags
     # ----------------------
     if enable_length:
-        len_groups = defaultdict(list)
-        for it in items:
-            tag = _length_tag(it)
-            len_groups[tag].append(it.get("Id"))
-
         len_titles = {
             "length:short": "Length: Short (≤75m)",
             "length:standard": "Length: Standard (76–110m)",
@@ -363,18 +581,13 @@ def build_suggestions(
                     ids,
                     "runtime-based",
                     {"tag": tag},
-                    now
+                    now, id_base, id_ctr
                 ))
 
     # ----------------------
     # E) Audience tags
     # ----------------------
     if enable_audience:
-        aud_groups = defaultdict(list)
-        for it in items:
-            tag = _audience_tag(it)
-            aud_groups[tag].append(it.get("Id"))
-
         aud_titles = {
             "audience:kids": "Audience: Kids",
             "audience:family": "Audience: Family",
@@ -398,22 +611,13 @@ def build_suggestions(
                     ids,
                     "official rating (+ genre inference if missing)",
                     {"tag": tag},
-                    now
+                    now, id_base, id_ctr
                 ))
 
     # ----------------------
     # F) Mood/Occasion tags (can overlap; we keep them)
     # ----------------------
     if enable_mood:
-        mood_groups = defaultdict(list)
-        mood_reason = defaultdict(lambda: Counter())
-
-        for it in items:
-            item_id = it.get("Id")
-            for tag, conf, rsn in _mood_tags(it):
-                mood_groups[tag].append((item_id, conf))
-                mood_reason[tag][rsn] += 1
-
         mood_titles = {
             "mood:cozy": "Mood: Cozy",
             "mood:funny": "Mood: Funny",
@@ -444,10 +648,14 @@ def build_suggestions(
                 ids,
                 common_reason,
                 {"tag": tag},
-                now
+                now, id_base, id_ctr
             ))
 
     # IMPORTANT: We do NOT dedupe across tag suggestions. Movies should get multiple tags.
     # We only keep sorting for UI readability.
-    suggestions.sort(key=lambda s: (s["confidence"], len(s["item_ids"])), reverse=True)
+    # Sort on the key precomputed by _make_suggestion (highest confidence, then
+    # largest group first), then drop it from the returned dicts.
+    suggestions.sort(key=operator.itemgetter("_sortkey"))
+    for s in suggestions:
+        del s["_sortkey"]
     return suggestions
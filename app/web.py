@@ -1,12 +1,12 @@
 # -*- coding: utf-8 -*-
-from fastapi import APIRouter
+import hashlib
+
+from fastapi import APIRouter, Request, Response
 from fastapi.responses import HTMLResponse
 
 router = APIRouter()
 
-@router.get("/", response_class=HTMLResponse)
-def index():
-    return """
+_INDEX_HTML = """
 <!doctype html>
 <html>
 <head>
@@ -75,3 +75,15 @@ load();
 </body>
 </html>
 """
+
+# The page is static: encode it and hash it once at import instead of per request
+_INDEX_BYTES = _INDEX_HTML.encode("utf-8")
+_INDEX_ETAG = '"%s"' % hashlib.md5(_INDEX_BYTES).hexdigest()
+_INDEX_HEADERS = {"ETag": _INDEX_ETAG, "Cache-Control": "public, max-age=3600"}
+
+@router.get("/", response_class=HTMLResponse)
+def index(request: Request):
+    inm = request.headers.get("if-none-match")
+    if inm and (inm.strip() == "*" or _INDEX_ETAG in (t.strip() for t in inm.split(","))):
+        return Response(status_code=304, headers=_INDEX_HEADERS)
+    return Response(content=_INDEX_BYTES, media_type="text/html; charset=utf-8", headers=_INDEX_HEADERS)